@@ -0,0 +1,92 @@
+import math
+import time
+import timeit
+from dataclasses import dataclass, field
+
+from pyoak.match.xpath import ASTXpath
+from pyoak.node import ASTNode
+
+
+@dataclass(frozen=True)
+class XInner(ASTNode):
+    attr1: str
+    child: ASTNode
+    child_tuple: tuple[ASTNode, ...] = field(default_factory=tuple)
+
+
+@dataclass(frozen=True)
+class XLeaf(ASTNode):
+    attr2: str
+
+
+COUNTER: int = 0
+
+
+def gen_sample_tree(max_depth: int, max_nodes: int) -> ASTNode:
+    global COUNTER
+    if max_depth == 0:
+        COUNTER += 1
+        return XLeaf(attr2=f"leaf_{COUNTER}")
+
+    mandatory_child = gen_sample_tree(max_depth - 1, max_nodes)
+    tuple_children = tuple(gen_sample_tree(max_depth - 1, max_nodes) for _ in range(max_nodes - 1))
+
+    COUNTER += 1
+    return XInner(
+        attr1=f"attr1_{COUNTER}",
+        child=mandatory_child,
+        child_tuple=tuple_children,
+    )
+
+
+def run_benchmark():
+    TREE_MAX_SIZE = 100000
+    DEPTH = 12
+    max_nodes = math.floor(math.pow(TREE_MAX_SIZE, 1 / DEPTH))
+
+    st = time.monotonic()
+    tree = gen_sample_tree(DEPTH, max_nodes)
+
+    print(f"Time to build tree with {COUNTER} nodes: {time.monotonic() - st:.6f} seconds")
+
+    st = time.monotonic()
+    py_tree = tree.to_tree()
+    print(f"Time to build the Tree object: {time.monotonic() - st:.6f} seconds")
+
+    # A leaf at the bottom of the tree for the match benchmark
+    deep_leaf = next(iter(ASTXpath("//XLeaf").findall(tree)))
+
+    xpaths = [
+        "//XLeaf",
+        "/XInner//XLeaf",
+        "//XInner/@child[]XLeaf",
+        "//XInner//XInner/@child_tuple[0]XLeaf",
+    ]
+
+    st = time.monotonic()
+    for xp in xpaths:
+        ASTXpath.clear_cache()
+        ASTXpath(xp)
+    print(f"Time to parse & compile {len(xpaths)} xpaths: {time.monotonic() - st:.6f} seconds")
+
+    n = 10
+    for xp in xpaths:
+        xpath = ASTXpath(xp)
+
+        def run_findall(xpath: ASTXpath = xpath) -> None:
+            xpath.invalidate_cache()
+            list(xpath.findall(tree))
+
+        ttime = timeit.timeit(run_findall, number=n)
+        print(f"findall {xp!r} (tree size: {COUNTER}, invocations: {n}): {ttime:.6f} seconds")
+
+    n = 10000
+    for xp in xpaths:
+        xpath = ASTXpath(xp)
+
+        ttime = timeit.timeit(lambda xpath=xpath: xpath.match(py_tree, deep_leaf), number=n)
+        print(f"match {xp!r} (invocations: {n}): {ttime:.6f} seconds")
+
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -126,49 +126,65 @@ xpath_parser = Lark(
 def _match_node_xpath(
     node: ASTNode | None, elements: list[ASTXpathElement | ASTXpathAnywhereElement]
 ) -> bool:
-    # Node is None when the function was called from the root of the AST
-    if node is None:
-        # Only match if the remaining xpath is empty or an anywhere element
-        if len(elements) == 0 or isinstance(elements[0], ASTXpathAnywhereElement):
-            return True
-        else:
-            return False
-
-    # Node is not None, but the xpath is empty = no match
-    if len(elements) == 0:
-        return False
-
-    element = elements[0]
-
-    # ASTXpathAnywhereElement only appears at the beggining of the xpath (`here --> //xpath_tail`)
-    # so we may return positive match without going further up the AST
-    if isinstance(element, ASTXpathAnywhereElement):
-        return True
-
-    if element.anywhere:
-        # Anywhere case. Means we need to try matching not only current node
-        # but also all of it ancestors
-        # and if anyone matches then the whole xpath matches
-        for ancestor in node.ancestors():
-            if _match_node_xpath(ancestor, elements):
+    n_els = len(elements)
+
+    # Alternative (node, element index) branches to try if the current one fails.
+    # Together with advancing an index instead of slicing the elements list,
+    # this replaces the previous recursive implementation, avoiding a Python
+    # frame and a list copy per parent hop.
+    # The last flag suppresses re-expanding the same anywhere element at
+    # branches that were queued as ancestor alternatives themselves.
+    stack: list[tuple[ASTNode | None, int, bool]] = [(node, 0, True)]
+
+    while stack:
+        n, i, expand_anywhere = stack.pop()
+
+        while True:
+            # Node is None when we walked past the root of the AST
+            if n is None:
+                # Only match if the remaining xpath is empty or an anywhere element
+                if i >= n_els or isinstance(elements[i], ASTXpathAnywhereElement):
+                    return True
+                break
+
+            # Node is not None, but the xpath is empty = no match
+            if i >= n_els:
+                break
+
+            element = elements[i]
+
+            # ASTXpathAnywhereElement only appears at the beggining of the xpath
+            # (`here --> //xpath_tail`)
+            # so we may return positive match without going further up the AST
+            if isinstance(element, ASTXpathAnywhereElement):
                 return True
 
-    # Ok, so we are somewhere in the middle (or start) of the search
-    # If it was anywhere element, none of the ancestors matched
-    # First we need to match the current node to the current expected element
-    c_parent_field = node.parent_field.name if node.parent_field else None
-    c_index = node.parent_index
-
-    if (
-        isinstance(node, element.ast_class)
-        and (element.parent_field is None or element.parent_field == c_parent_field)
-        and (element.parent_index is None or element.parent_index == c_index)
-    ):
-        # The current node matches the current element, so we need to go up the AST
-        # Elements are already in reversed order, so we pass the tail of the elements list
-        return _match_node_xpath(node.parent, elements[1:])
-    else:
-        return False
+            if element.anywhere and expand_anywhere:
+                # Anywhere case. Means we need to try matching not only current node
+                # but also all of it ancestors
+                # and if anyone matches then the whole xpath matches
+                stack.extend((ancestor, i, False) for ancestor in n.ancestors())
+
+            # Ok, so we are somewhere in the middle (or start) of the search
+            # First we need to match the current node to the current expected element
+            c_parent_field = n.parent_field.name if n.parent_field else None
+            c_index = n.parent_index
+
+            if (
+                isinstance(n, element.ast_class)
+                and (element.parent_field is None or element.parent_field == c_parent_field)
+                and (element.parent_index is None or element.parent_index == c_index)
+            ):
+                # The current node matches the current element, so we need to go up
+                # the AST and match the next element (elements are already reversed)
+                n = n.parent
+                i += 1
+                expand_anywhere = True
+            else:
+                # No match, back off to the next queued branch
+                break
+
+    return False
 
 
 class ASTXpath:
@@ -1,18 +1,40 @@
+"""XPath-like matching & searching of AST nodes.
+
+Performance notes:
+    Each unique xpath string is parsed once (instances are cached) and
+    compiled into specialized match & findall functions, with per-element
+    predicates and class-reachability pruning baked in at compile time.
+
+    Bulk evaluation over a flattened (struct-of-arrays) tree representation
+    with a JIT (e.g. numba) was considered for workloads with many xpaths
+    over many large trees, but rejected: it would add heavy optional
+    dependencies and a node<->index mapping layer for a gain that only
+    materializes once tree traversal itself is no longer the bottleneck.
+    Revisit if profiling ever shows the compiled matchers dominating.
+"""
+
 from __future__ import annotations
 
 import logging
-from dataclasses import dataclass
-from typing import Generator, NamedTuple, Type, cast
-
-from lark import Lark, UnexpectedInput
-from lark.visitors import Transformer
+import sys
+import weakref
+from collections import OrderedDict
+from itertools import chain
+from typing import Any, Callable, Generator, Iterable, Iterator, Type, cast, get_args
 
+from .. import config
 from ..match.error import ASTXpathDefinitionError
 from ..match.helpers import check_and_get_ast_node_type
-from ..node import ASTNode, NodeTraversalInfo
+from ..node import ASTNode
+from ..serialize import TYPES
 from ..tree import Tree
+from ..types import get_cls_child_fields
 from ..typing import Field
+from ._xpath_lalr import Lark_StandAlone, Transformer, UnexpectedInput, v_args
 
+# The grammar is kept for reference & regeneration only. The actual parser
+# is pre-generated into the _xpath_lalr module via:
+#   python -m lark.tools.standalone --start xpath <grammar file>
 xpath_grammar = """
 xpath: element* self
 
@@ -36,11 +58,22 @@ class_spec: CNAME
 logger = logging.getLogger(__name__)
 
 
-class ASTXpathElement(NamedTuple):
-    ast_class: type[ASTNode]
-    parent_field: str | None
-    parent_index: int | None
-    anywhere: bool
+class ASTXpathElement:
+    """A single parsed element of an xpath."""
+
+    __slots__ = ("ast_class", "parent_field", "parent_index", "anywhere")
+
+    def __init__(
+        self,
+        ast_class: type[ASTNode],
+        parent_field: str | None,
+        parent_index: int | None,
+        anywhere: bool,
+    ) -> None:
+        self.ast_class = ast_class
+        self.parent_field = parent_field
+        self.parent_index = parent_index
+        self.anywhere = anywhere
 
 
 class XPathTransformer(Transformer[str, list[ASTXpathElement]]):
@@ -49,37 +82,24 @@ class XPathTransformer(Transformer[str, list[ASTXpathElement]]):
     ) -> list[ASTXpathElement]:
         ret: list[ASTXpathElement] = []
 
-        # The following logic parses the xpath in reverse order
-        elements = reversed(args)
-        for el in elements:
-            parent_field, parent_index, ast_class = el
-
-            while ast_class is None:
-                next_el = next(elements, None)
-                if next_el is None:
-                    # We are at the very beginning of the xpath
-                    # and it starts with // (or more)
-                    # change last element to anywhere and return
-                    ret[-1] = ASTXpathElement(
-                        ret[-1].ast_class, ret[-1].parent_field, ret[-1].parent_index, True
-                    )
-                    return ret
-
-                # Change last element to anywhere
-                ret[-1] = ASTXpathElement(
-                    ret[-1].ast_class, ret[-1].parent_field, ret[-1].parent_index, True
-                )
-
-                parent_field, parent_index, ast_class = next_el
+        # Elements are built in xpath (root to node) order in one pass.
+        # A class-less element (`//` and longer runs) means the next
+        # concrete element may match anywhere below its ancestor
+        anywhere = False
+        for parent_field, parent_index, ast_class in args:
+            if ast_class is None:
+                anywhere = True
+                continue
 
             ret.append(
                 ASTXpathElement(
                     ast_class=ast_class,
                     parent_field=parent_field,
                     parent_index=parent_index,
-                    anywhere=False,
+                    anywhere=anywhere,
                 )
             )
+            anywhere = False
 
         return ret
 
@@ -108,125 +128,411 @@ class XPathTransformer(Transformer[str, list[ASTXpathElement]]):
     ) -> tuple[str | None, int | None, Type[ASTNode] | None]:
         return self.element(args)
 
-    def class_spec(self, args: list[str]) -> Type[ASTNode]:
-        type_, msg = check_and_get_ast_node_type(args[0])
+    @v_args(inline=True)
+    def class_spec(self, name: str) -> Type[ASTNode]:
+        type_, msg = check_and_get_ast_node_type(name)
 
         if type_ is None:
             raise ASTXpathDefinitionError(msg)
 
         return type_
 
-    def index_spec(self, args: list[str]) -> int:
-        if len(args) == 0:
+    @v_args(inline=True)
+    def index_spec(self, *digits: str) -> int:
+        if len(digits) == 0:
             return -1
-        return int(args[0])
+        return int(digits[0])
+
+    @v_args(inline=True)
+    def field_spec(self, name: str) -> str:
+        # Intern the name (dropping the Token subclass), so that comparisons
+        # against interned field names in the hot path are pointer checks
+        return sys.intern(str(name))
+
+
+xpath_parser = Lark_StandAlone(transformer=XPathTransformer())  # type: ignore[no-untyped-call]
 
-    def field_spec(self, args: list[str]) -> str:
-        return args[0]
 
+# Classes reachable (as descendants) from instances of a given class,
+# derived from static child field annotations. Rebuilt lazily whenever
+# new node classes are registered (TYPES only ever grows).
+_REACHABLE: dict[type[ASTNode], frozenset[type[ASTNode]]] = {}
+# Per target class: classes whose instances may contain a matching descendant
+_CONTAINERS: dict[type[ASTNode], frozenset[type[ASTNode]]] = {}
+_REACHABLE_VERSION = -1
 
-xpath_parser = Lark(
-    grammar=xpath_grammar, start="xpath", parser="lalr", transformer=XPathTransformer()
-)
 
+def _iter_node_classes(type_: Any) -> Iterator[type[ASTNode]]:
+    """Yield all ASTNode subclasses mentioned in a (possibly nested) field
+    annotation."""
+    if isinstance(type_, type):
+        if issubclass(type_, ASTNode):
+            yield type_
+        return
 
-# Relax version of NodeTraversalInfo allowing root nodes
-class _NodeTraversalInfo(NamedTuple):
-    node: ASTNode
-    parent: ASTNode | None
-    field: Field | None
-    findex: int | None
+    for arg in get_args(type_):
+        yield from _iter_node_classes(arg)
 
 
-def _match_node_element(
-    n_info: _NodeTraversalInfo | NodeTraversalInfo, element: ASTXpathElement
-) -> bool:
-    if (
-        isinstance(n_info.node, element.ast_class)
-        and (
-            element.parent_field is None
-            or (n_info.field is not None and element.parent_field == n_info.field.name)
+def _rebuild_reachable() -> None:
+    node_classes = [t for t in TYPES.values() if isinstance(t, type) and issubclass(t, ASTNode)]
+
+    # Direct containment edges from static child field annotations,
+    # expanded to all known subclasses of the annotated types
+    reachable: dict[type[ASTNode], set[type[ASTNode]]] = {}
+    for c in node_classes:
+        bases: set[type[ASTNode]] = set()
+        for type_info in get_cls_child_fields(c).values():
+            bases.update(_iter_node_classes(type_info.resolved_type))
+
+        reachable[c] = {t for t in node_classes if any(issubclass(t, b) for b in bases)}
+
+    # Expand to the transitive closure (fixed point)
+    changed = True
+    while changed:
+        changed = False
+        for r in reachable.values():
+            add: set[type[ASTNode]] = set()
+            for d in r:
+                add |= reachable[d]
+
+            if not add <= r:
+                r |= add
+                changed = True
+
+    _REACHABLE.clear()
+    _REACHABLE.update({c: frozenset(r) for c, r in reachable.items()})
+
+
+def _get_containers(target: type[ASTNode]) -> frozenset[type[ASTNode]]:
+    """Return the set of classes whose instances may have a descendant
+    matching `isinstance(x, target)`."""
+    global _REACHABLE_VERSION
+
+    if _REACHABLE_VERSION != len(TYPES):
+        _rebuild_reachable()
+        _CONTAINERS.clear()
+        _REACHABLE_VERSION = len(TYPES)
+
+    ret = _CONTAINERS.get(target)
+    if ret is None:
+        ret = _CONTAINERS[target] = frozenset(
+            c for c, r in _REACHABLE.items() if any(issubclass(t, target) for t in r)
         )
-        and (element.parent_index is None or element.parent_index == n_info.findex)
-    ):
-        return True
 
-    return False
+    return ret
+
+
+# Type of the per-element predicates built at xpath compile time
+_ElementPredicate = Callable[["ASTNode", "Field | None", "int | None"], bool]
+
+
+def _iter_subclasses(cls: type[ASTNode]) -> Iterator[type[ASTNode]]:
+    """Yield the class itself and all of its (transitive) subclasses."""
+    yield cls
+
+    for sub in cls.__subclasses__():
+        yield from _iter_subclasses(sub)
+
+
+def _build_element_predicate(element: ASTXpathElement) -> _ElementPredicate:
+    """Build a predicate for a single xpath element with the element's filters
+    baked in as constants.
+
+    This avoids unpacking the element and re-checking which filters are
+    present on every visited node. The returned predicate is specialized
+    on which of the optional filters are present: a bare class filter
+    (the common case) does a single memo lookup per node with no filter
+    checks at all.
+    """
+    _ac = element.ast_class
+    _pf = element.parent_field
+    _pi = element.parent_index
+
+    # Memoized `isinstance(node, _ac)` per concrete type: a dict hit is a
+    # single hash lookup instead of an MRO walk per visited node. Seeded
+    # with the subclasses known now; classes defined after the xpath was
+    # compiled are resolved on first encounter.
+    _tmemo: dict[type[ASTNode], bool] = dict.fromkeys(_iter_subclasses(_ac), True)
+
+    if _pf is None and _pi is None:
+
+        def predicate_class_only(node: ASTNode, field: Field | None, findex: int | None) -> bool:
+            tp = type(node)
+            m = _tmemo.get(tp)
+            if m is None:
+                m = _tmemo[tp] = issubclass(tp, _ac)
+
+            return m
+
+        return predicate_class_only
+
+    if _pi is None:
+
+        def predicate_class_field(node: ASTNode, field: Field | None, findex: int | None) -> bool:
+            tp = type(node)
+            m = _tmemo.get(tp)
+            if m is None:
+                m = _tmemo[tp] = issubclass(tp, _ac)
+
+            return m and field is not None and _pf == field.name
+
+        return predicate_class_field
+
+    if _pf is None:
+
+        def predicate_class_index(node: ASTNode, field: Field | None, findex: int | None) -> bool:
+            tp = type(node)
+            m = _tmemo.get(tp)
+            if m is None:
+                m = _tmemo[tp] = issubclass(tp, _ac)
+
+            return m and _pi == findex
+
+        return predicate_class_index
+
+    def predicate(node: ASTNode, field: Field | None, findex: int | None) -> bool:
+        tp = type(node)
+        m = _tmemo.get(tp)
+        if m is None:
+            m = _tmemo[tp] = issubclass(tp, _ac)
+
+        return m and (field is not None and _pf == field.name) and _pi == findex
+
+    return predicate
 
 
-def _match_node_xpath(tree: Tree, node: ASTNode, elements: list[ASTXpathElement]) -> bool:
-    element = elements[0]
+_IND = " " * 4
 
-    # Ok, so we are somewhere in the middle (or start) of the search
-    # First we need to match the current node to the current expected element
-    c_parent, c_parent_field, c_index = tree.get_parent_info(node)
 
-    if not _match_node_element(
-        _NodeTraversalInfo(node, c_parent, c_parent_field, c_index), element
-    ):
-        return False
+def _indent(txt: str, times: int = 1) -> str:
+    return "\n".join([_IND * times + line if line.strip() else line for line in txt.split("\n")])
 
-    # The current node matches the current element, so we need to go up the AST
-    # Elements are already in reversed order, so we pass the tail of the elements list
-    tail = elements[1:]
 
-    if len(tail) == 0:
-        # If we werr checking the last element, then there are two options:
-        # - it was anywhere => we have a match
-        # - it was not anywhere => we need to check if the node has no parent
-        #   and if it doesn't then we have a match
-        return element.anywhere or c_parent is None
+def _create_fn(fname: str, args: str, body: str, local_vars: dict[str, Any]) -> Callable[..., Any]:
+    """Create a specialized function via exec.
 
-    # Ok, so we have remaining elements to match
-    # If no parent then no match
-    if c_parent is None:
-        return False
+    Same approach as pyoak.codegen, but returns the function instead of
+    binding it to a class.
+    """
+    inner = f"{_IND}def {fname}({args}):\n" + _indent(body, 2)
 
-    # Otherwise we need to match the remaining elements to the parent
-    if element.anywhere:
-        # Anywhere means any ancestor can match
-        for ancestor in tree.get_ancestors(node):
-            if _match_node_xpath(tree, ancestor, tail):
-                return True
-    else:
-        # Otherwise we need to match only the direct parent
-        return _match_node_xpath(tree, c_parent, tail)
+    # Print the code if debug is enabled
+    if config.CODEGEN_DEBUG:
+        print(inner)
 
-    # No match
-    return False
+    # From stdlib.dataclasses. Create a function in a new namespace
+    # that will create a closure and return the function
+    txt = f"def __create_fn__({', '.join(local_vars.keys())}):\n{inner}\n{_IND}return {fname}"
+    ns: dict[str, Any] = {}
+    exec(txt, None, ns)
 
+    new_f = ns["__create_fn__"](**local_vars)
+    new_f.__qualname__ = f"ASTXpath.{fname}"
 
-_AST_XPATH_CACHE: dict[str, ASTXpath] = {}
+    return cast(Callable[..., Any], new_f)
 
 
-# A helper class used in the xpath find method
-@dataclass(frozen=True)
-class _DUMMY_XPATH_ROOT(ASTNode):
-    child: ASTNode
+def _gen_match_fn(elements_reversed: list[ASTXpathElement]) -> Callable[[Tree, ASTNode], bool]:
+    """Generate a specialized match function for the given xpath.
+
+    The recursive match over the reversed element list is unrolled into a
+    straight-line chain of per-element checks walking up the parent chain,
+    with one nested loop over ancestors per `anywhere` element.
+    """
+    local_vars: dict[str, Any] = {}
+
+    lines: list[str] = []
+    # Nesting level of ancestor loops. Failing a check inside a loop
+    # backtracks to the next ancestor; at the top level it fails the match.
+    depth = 0
+    fail = "return False"
+
+    def emit(line: str, extra: int = 0) -> None:
+        lines.append(_IND * (depth + extra) + line)
+
+    last = len(elements_reversed) - 1
+
+    # Hoist the bound method lookups out of the per-element checks
+    emit("_gpi = tree.get_parent_info")
+    if any(el.anywhere for el in elements_reversed[:last]):
+        emit("_ga = tree.get_ancestors")
+
+    emit("n0 = node")
+
+    for j, el in enumerate(elements_reversed):
+        local_vars[f"_p{j}"] = _build_element_predicate(el)
+
+        emit(f"p{j}, f{j}, i{j} = _gpi(n{j})")
+        emit(f"if not _p{j}(n{j}, f{j}, i{j}):")
+        emit(fail, 1)
+
+        if j == last:
+            # The last element either allows any path above (anywhere)
+            # or requires the current node to be the root
+            if el.anywhere:
+                emit("return True")
+            else:
+                emit(f"if p{j} is None:")
+                emit("return True", 1)
+                emit(fail)
+            break
+
+        # More elements to match above, so there must be a parent
+        emit(f"if p{j} is None:")
+        emit(fail, 1)
+
+        if el.anywhere:
+            # Anywhere means any ancestor can match the next element
+            emit(f"for n{j + 1} in _ga(n{j}):")
+            depth += 1
+            fail = "continue"
+        else:
+            # Otherwise only the direct parent
+            emit(f"n{j + 1} = p{j}")
+
+    if depth > 0:
+        # All ancestor combinations exhausted
+        lines.append("return False")
+
+    return _create_fn("_match_xpath", "tree, node", "\n".join(lines), local_vars)
+
+
+def _gen_findall_fn(
+    elements: list[ASTXpathElement],
+) -> Callable[[ASTNode], Generator[ASTNode, None, None]]:
+    """Generate a specialized findall function for the given xpath.
+
+    The per-element filtering passes are fused into a single traversal:
+    one nested loop per element with the match yielded from the innermost
+    level. Per-level id sets replace the intermediate work lists, guarding
+    against re-visiting the same node through overlapping anywhere paths
+    (or repeated instances within one tree).
+    """
+    local_vars: dict[str, Any] = {"_gc": _get_containers}
+
+    lines: list[str] = []
+    # Each element adds one level of loop nesting
+    depth = 0
+
+    def emit(line: str, extra: int = 0) -> None:
+        lines.append(_IND * (depth + extra) + line)
+
+    last = len(elements) - 1
+
+    # Hoist the bound seen-set adds out of the traversal loops
+    for j in range(len(elements)):
+        if j > 0 or elements[0].anywhere:
+            emit(f"seen{j} = set()")
+            emit(f"seen{j}_add = seen{j}.add")
+
+    for j, el in enumerate(elements):
+        local_vars[f"_p{j}"] = _build_element_predicate(el)
+
+        guard = True
+        if el.anywhere:
+            # The descendant scan is inlined as an explicit pre-order stack
+            # instead of going through the dfs generator machinery
+            if j == 0:
+                # The first element considers the root itself as well
+                emit("stack0 = [(root, None, None)]")
+            else:
+                emit(f"stack{j} = list(n{j - 1}.get_child_nodes_with_field())")
+                emit(f"stack{j}.reverse()")
+            emit(f"while stack{j}:")
+            depth += 1
+            emit(f"c{j}, f{j}, i{j} = stack{j}.pop()")
+
+            if el.ast_class is not ASTNode:
+                # Skip descending into subtrees that cannot contain the
+                # target class
+                local_vars[f"_t{j}"] = el.ast_class
+                emit(f"if type(c{j}) in _gc(_t{j}):")
+                descend_extra = 1
+            else:
+                descend_extra = 0
+
+            emit(f"ch{j} = list(c{j}.get_child_nodes_with_field())", descend_extra)
+            emit(f"ch{j}.reverse()", descend_extra)
+            emit(f"stack{j}.extend(ch{j})", descend_extra)
+
+            emit(f"if not _p{j}(c{j}, f{j}, i{j}):")
+            emit("continue", 1)
+            emit(f"n{j} = c{j}")
+        elif j == 0:
+            # The first element is matched against the root directly
+            emit("if _p0(root, None, None):")
+            depth += 1
+            emit("n0 = root")
+            # A single candidate, no dedup necessary
+            guard = False
+        else:
+            emit(f"for c{j}, f{j}, i{j} in n{j - 1}.get_child_nodes_with_field():")
+            depth += 1
+            emit(f"if not _p{j}(c{j}, f{j}, i{j}):")
+            emit("continue", 1)
+            emit(f"n{j} = c{j}")
+
+        if guard:
+            emit(f"if id(n{j}) in seen{j}:")
+            emit("continue", 1)
+            emit(f"seen{j}_add(id(n{j}))")
+
+        if j == last:
+            emit(f"yield n{j}")
+
+    return _create_fn("_findall_xpath", "root", "\n".join(lines), local_vars)
+
+
+_AST_XPATH_CACHE: OrderedDict[str, ASTXpath] = OrderedDict()
+_AST_XPATH_CACHE_MAX_SIZE = 1024
 
 
 class ASTXpath:
     """A parsed XPath for AST nodes."""
 
-    def __new__(cls, xpath: str) -> ASTXpath:
-        if xpath not in _AST_XPATH_CACHE:
-            _AST_XPATH_CACHE[xpath] = super().__new__(cls)
-        return _AST_XPATH_CACHE[xpath]
+    # Normalized xpath string, assigned in __new__ before __init__ runs
+    _xpath: str
 
-    def __init__(self, xpath: str) -> None:
+    def __new__(cls, xpath: str) -> ASTXpath:
         if not xpath.startswith("/"):
-            # Relative path is the same as absolute path starting with "anywehere"
+            # Relative path is the same as absolute path starting with "anywehere".
+            # Normalizing before the cache lookup makes equivalent relative
+            # & absolute strings share a single parsed instance
             xpath = "//" + xpath
 
+        cached = _AST_XPATH_CACHE.get(xpath)
+
+        if cached is None:
+            cached = _AST_XPATH_CACHE[xpath] = super().__new__(cls)
+            cached._xpath = xpath
+
+            # Evict the least recently used xpath to keep the cache bounded
+            if len(_AST_XPATH_CACHE) > _AST_XPATH_CACHE_MAX_SIZE:
+                _AST_XPATH_CACHE.popitem(last=False)
+        else:
+            _AST_XPATH_CACHE.move_to_end(xpath)
+
+        return cached
+
+    def __init__(self, xpath: str) -> None:
+        # __init__ runs on every construction, even when __new__ returned
+        # an already parsed instance from the cache - don't re-parse then
+        if hasattr(self, "_elements"):
+            return
+
+        # Use the normalized form stored by __new__
+        xpath = self._xpath
+
         try:
-            # Reversed list used for matching from the node UP to the root
-            self._elements_reversed = cast(
+            # Normal list used for searching from the root DOWN
+            self._elements = cast(
                 list[ASTXpathElement],
                 xpath_parser.parse(xpath),
             )
 
-            # Normal list used for searching from the root DOWN
-            self._elements = list(reversed(self._elements_reversed))
+            # Reversed list used for matching from the node UP to the root
+            self._elements_reversed = list(reversed(self._elements))
         except UnexpectedInput as e:
             raise ASTXpathDefinitionError(
                 f"Incorrect xpath definition. Context:\n{e.get_context(xpath)}"
@@ -236,6 +542,31 @@ class ASTXpath:
         except Exception as e:
             raise ASTXpathDefinitionError("Incorrect xpath definition") from e
 
+        # Every element but the last consumes at least one parent hop,
+        # so a matching node has at least this many ancestors. Without
+        # anywhere elements each element consumes exactly one level
+        self._min_depth = len(self._elements) - 1
+        self._exact_depth = not any(el.anywhere for el in self._elements)
+
+        # Compile specialized match & findall functions for this xpath
+        self._match_fn = _gen_match_fn(self._elements_reversed)
+        self._findall_fn = _gen_findall_fn(self._elements)
+
+        # Cheap node-level filter on the self element, used by
+        # multi_findall to dispatch before running the full matcher
+        self._self_predicate = _build_element_predicate(self._elements_reversed[0])
+
+        # Materialized findall results per root node. Doesn't prevent
+        # garbage collection of the trees searched in the past
+        self._findall_cache: weakref.WeakKeyDictionary[
+            ASTNode, list[ASTNode]
+        ] = weakref.WeakKeyDictionary()
+
+    @classmethod
+    def clear_cache(cls) -> None:
+        """Clear the global cache of parsed xpaths."""
+        _AST_XPATH_CACHE.clear()
+
     def match(self, tree_or_root: ASTNode | Tree, node: ASTNode) -> bool:
         """Match the `node` to the xpath in the `tree_or_root`."""
         if not isinstance(tree_or_root, Tree):
@@ -244,38 +575,99 @@ class ASTXpath:
         if not tree_or_root.is_in_tree(node):
             raise ValueError("The node is not in the tree")
 
-        return _match_node_xpath(tree_or_root, node, self._elements_reversed)
+        # Cheap O(1) depth reject before running the compiled matcher
+        depth = tree_or_root.get_depth(node)
+        if depth < self._min_depth or (self._exact_depth and depth != self._min_depth):
+            return False
+
+        return self._match_fn(tree_or_root, node)
 
     def findall(self, root: ASTNode) -> Generator[ASTNode, None, None]:
         """Find all nodes in the `root` that match the xpath.
 
+        Results are cached per root node, which is safe as long as the
+        tree under `root` is not changed (e.g. via node `replace`) between
+        calls. Use `invalidate_cache` after changing a tree that was
+        searched before.
+
         Adapted from antlr4-python3-runtime/src/Python3/antlr4/xpath/Xpath.py
         Copyright (c) 2012-2017 The ANTLR Project. All rights reserved.
         Use of this file is governed by the BSD 3-clause license that
         can be found in the LICENSE.txt file in the project root.
         """
-        # Using dict, because set is not ordered
-        work: dict[_NodeTraversalInfo | NodeTraversalInfo, None] = {
-            _NodeTraversalInfo(_DUMMY_XPATH_ROOT(root), None, None, None): None
-        }
-
-        for el in self._elements:
-            new_work: dict[_NodeTraversalInfo | NodeTraversalInfo, None] = {}
-
-            for n_info in work:
-                if el.anywhere:
-                    for c_info in n_info.node.dfs():
-                        if _match_node_element(c_info, el):
-                            # Insert into our "ordered set" only if not already in there
-                            # this is to prefer first insertion order
-                            if c_info not in new_work:
-                                new_work[c_info] = None
-                else:
-                    for c, f, i in n_info.node.get_child_nodes_with_field():
-                        c_info = NodeTraversalInfo(c, n_info.node, f, i)
-                        if _match_node_element(c_info, el):
-                            if c_info not in new_work:
-                                new_work[c_info] = None
-            work = new_work
-
-        yield from [n_info.node for n_info in new_work.keys()]
+        cached = self._findall_cache.get(root)
+        if cached is not None:
+            yield from cached
+            return
+
+        result = list(self._findall_fn(root))
+        self._findall_cache[root] = result
+
+        yield from result
+
+    @classmethod
+    def multi_findall(
+        cls, xpaths: Iterable[ASTXpath | str], root: ASTNode
+    ) -> dict[ASTXpath, list[ASTNode]]:
+        """Evaluate multiple xpaths against the `root` in a single tree walk.
+
+        Equivalent to calling `findall` for each xpath, but walks the tree
+        once, testing every visited node only against the xpaths whose self
+        element may match it. Prefer this when evaluating many xpaths
+        against the same tree. String xpaths are parsed as via `ASTXpath`.
+
+        Returns a mapping from each (parsed) xpath to the list of matching
+        nodes. Cached `findall` results are reused and the results of the
+        walk are cached under the same conditions as `findall`'s.
+        """
+        parsed = [xp if isinstance(xp, ASTXpath) else cls(xp) for xp in xpaths]
+
+        ret: dict[ASTXpath, list[ASTNode]] = {}
+        pending: list[ASTXpath] = []
+        for xp in parsed:
+            cached = xp._findall_cache.get(root)
+            if cached is not None:
+                ret[xp] = list(cached)
+            elif xp not in ret:
+                ret[xp] = []
+                pending.append(xp)
+
+        if not pending:
+            return ret
+
+        tree = root.to_tree()
+        get_depth = tree.get_depth
+
+        seen: set[int] = set()
+        seen_add = seen.add
+
+        for node, field, findex in chain(
+            ((root, None, None),),
+            ((i.node, i.field, i.findex) for i in root.dfs()),
+        ):
+            if id(node) in seen:
+                continue
+            seen_add(id(node))
+
+            depth = get_depth(node)
+            for xp in pending:
+                if (
+                    depth >= xp._min_depth
+                    and (not xp._exact_depth or depth == xp._min_depth)
+                    and xp._self_predicate(node, field, findex)
+                    and xp._match_fn(tree, node)
+                ):
+                    ret[xp].append(node)
+
+        for xp in pending:
+            xp._findall_cache[root] = list(ret[xp])
+
+        return ret
+
+    def invalidate_cache(self, root: ASTNode | None = None) -> None:
+        """Drop the cached findall results for the `root` node, or for all
+        roots if `root` is None."""
+        if root is None:
+            self._findall_cache.clear()
+        else:
+            self._findall_cache.pop(root, None)
@@ -20,12 +20,14 @@ class Tree:
         self._root = root
         self._node_to_parent_info: dict[ASTNode, ParentInfo] = {}
         self._node_to_xpath: dict[ASTNode, str] = {root: f"/@root[0]{root.__class__.__name__}"}
+        self._node_to_depth: dict[ASTNode, int] = {root: 0}
 
         for n in root.dfs():
             self._node_to_parent_info[n.node] = ParentInfo(n.parent, n.field, n.findex)
             self._node_to_xpath[
                 n.node
             ] = f"{self._node_to_xpath[n.parent]}/@{n.field.name}[{n.findex or '0'}]{n.node.__class__.__name__}"
+            self._node_to_depth[n.node] = self._node_to_depth[n.parent] + 1
 
     @property
     def root(self) -> ASTNode:
@@ -106,17 +108,28 @@ class Tree:
             ValueError: If `relative_to` is not an ancestor of this node.
             KeyError: If the node is not in the tree.
         """
-        if relative_to is not None and check_ancestor and not self.is_ancestor(node, relative_to):
-            raise ValueError("relative_to must be an ancestor of the node")
+        if relative_to is None:
+            # Absolute depths are precomputed during tree building
+            return self._node_to_depth[node]
 
+        if check_ancestor:
+            if not self.is_ancestor(node, relative_to):
+                raise ValueError("relative_to must be an ancestor of the node")
+
+            return self._node_to_depth[node] - self._node_to_depth[relative_to]
+
+        # `relative_to` given but unchecked - walk up until we hit it
+        # or run past the root (same as depth up to the root)
+        depth = 0
         parent = self.get_parent(node)
-        if parent is None:
-            return 0
+        while parent is not None:
+            depth += 1
+            if parent is relative_to:
+                break
 
-        if relative_to is not None and parent is relative_to:
-            return 1
+            parent = self.get_parent(parent)
 
-        return self.get_depth(parent, relative_to, False) + 1
+        return depth
 
     def get_ancestors(self, node: ASTNode) -> Iterator[ASTNode]:
         """Iterates over all ancestors of the `node`.
@@ -35,6 +35,13 @@ def test_init() -> None:
     assert xpath is ASTXpath("//XpathNested")
     assert xpath is not ASTXpath("//XpathNestedSub")
 
+    # Relative xpaths normalize to the same cached instance
+    assert xpath is ASTXpath("XpathNested")
+
+    # Test cache clearing
+    ASTXpath.clear_cache()
+    assert xpath is not ASTXpath("//XpathNested")
+
     # Test non-existent class
     with pytest.raises(ASTXpathDefinitionError) as excinfo:
         ASTXpath("NonExistentClass")
@@ -158,3 +165,53 @@ def test_xpath_find() -> None:
 
     xpath = ASTXpath("@middle_tuple/XpathMiddle/@nested[]XpathNested")
     assert set(xpath.findall(r)) == {n}
+
+
+def test_xpath_multi_findall() -> None:
+    n = XpathNested("test")
+    m1 = XpathMiddle(n)
+    n2 = XpathNestedSub("test2")
+    m2 = XpathMiddle(n2)
+    mm = XpathMiddle(m1)
+    r = XpathRoot((mm, m2))
+
+    xpath_strs = [
+        "//XpathNested",
+        "/XpathRoot/XpathMiddle/XpathNested",
+        "/XpathRoot/[0]XpathMiddle//XpathNested",
+        "//XpathMiddle",
+        "/XpathRoot",
+    ]
+
+    results = ASTXpath.multi_findall(xpath_strs, r)
+
+    assert set(results.keys()) == {ASTXpath(xp) for xp in xpath_strs}
+
+    # Same matches as per-xpath findall
+    for xp in xpath_strs:
+        xpath = ASTXpath(xp)
+        xpath.invalidate_cache()
+        assert set(results[xpath]) == set(xpath.findall(r))
+
+    # Duplicate xpaths (e.g. equivalent relative & absolute) collapse
+    results = ASTXpath.multi_findall(["XpathNested", "//XpathNested"], r)
+    assert set(results.keys()) == {ASTXpath("//XpathNested")}
+    assert set(results[ASTXpath("//XpathNested")]) == {n2, n}
+
+
+def test_xpath_findall_cache() -> None:
+    n = XpathNested("test")
+    m = XpathMiddle(n)
+    r = XpathRoot((m,))
+
+    xpath = ASTXpath("//XpathNested")
+
+    # Repeated calls on the same root serve the cached result
+    assert list(xpath.findall(r)) == [n]
+    assert list(xpath.findall(r)) == [n]
+
+    # Invalidation (per root and full) re-runs the search
+    xpath.invalidate_cache(r)
+    assert list(xpath.findall(r)) == [n]
+    xpath.invalidate_cache()
+    assert list(xpath.findall(r)) == [n]